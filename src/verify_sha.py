@@ -6,11 +6,24 @@
 
 import sys
 import os
-import requests
 import base64
+import codecs
+import hashlib
+import json
 import re
-from typing import Dict, Optional, Tuple
-from dotenv import load_dotenv
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+import urllib3
+
+# 优先使用orjson解析响应（更快，直接接受bytes），未安装时回退到标准库
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
 
 # -----------------------------
 # 1) 配置参数（针对tech-docs-repository仓库）
@@ -43,42 +56,244 @@ CONFIG = {
             "verify_commit_details": "true",
             "allow_partial_match": "true"  # 允许部分匹配，降低难度
         }
+    },
+
+    # 缓存配置
+    "CACHE": {
+        "dir": "~/.cache/verify_sha",   # 缓存目录
+        "ttl_seconds": 600              # 搜索结果缓存有效期（秒），期内直接使用缓存不发请求
     }
 }
 
+# 提交SHA格式：40位十六进制字符
+_SHA_RE = re.compile(r"[0-9a-fA-F]{40}")
+
+# 仅查询验证所需的提交字段，避免REST接口返回完整的文件差异列表
+_COMMIT_QUERY = (
+    "query($o:String!,$r:String!,$s:GitObjectID!)"
+    "{repository(owner:$o,name:$r){object(oid:$s){... on Commit{oid message}}}}"
+)
+
+# -----------------------------
+# 2) HTTP连接池（复用连接，避免每次请求重新握手）
+# -----------------------------
+_POOL = urllib3.PoolManager(
+    num_pools=2,
+    maxsize=16,
+    retries=urllib3.Retry(
+        3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+    ),
+)
+
+# 所有请求共用的请求头（认证信息在verify_task中设置一次）
+_DEFAULT_HEADERS = {
+    "Accept": "application/vnd.github.v3+json",
+    "User-Agent": "verify-sha/1.0",
+}
+
+
+def _http_request(
+    method: str,
+    url: str,
+    headers: Dict[str, str],
+    body: Optional[bytes] = None
+) -> urllib3.HTTPResponse:
+    """通过共享连接池发送请求，合并默认请求头"""
+    return _POOL.request(
+        method, url, headers={**_DEFAULT_HEADERS, **headers}, body=body, timeout=10
+    )
+
 # -----------------------------
-# 2) 工具函数
+# 3) 工具函数
 # -----------------------------
+def _cache_path(owner: str, repo: str, endpoint: str) -> str:
+    """根据(owner, repo, endpoint)计算缓存文件路径"""
+    key = hashlib.sha256(f"{owner}/{repo}/{endpoint}".encode("utf-8")).hexdigest()
+    return os.path.join(os.path.expanduser(CONFIG["CACHE"]["dir"]), f"{key}.json")
+
+
+def _load_cache(path: str) -> Optional[Dict]:
+    """读取缓存条目，不存在或损坏时返回None"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_cache(path: str, entry: Dict) -> None:
+    """写入缓存条目，失败时忽略
+
+    先写入临时文件再原子替换，避免并发运行时读到写了一半的文件；
+    缓存目录仅对当前用户可见，因为其中可能包含私有仓库的文件内容。
+    """
+    cache_dir = os.path.dirname(path)
+    tmp_path = None
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"缓存写入失败 {path}: {e}", file=sys.stderr)
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _request_json(
+    url: str,
+    headers: Dict[str, str],
+    label: str,
+    cache_path: Optional[str] = None,
+    cached: Optional[Dict] = None
+) -> Tuple[bool, Optional[Dict]]:
+    """发送GET请求并解析JSON响应，指定cache_path时使用ETag条件请求"""
+    if cached:
+        headers = dict(headers)
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    try:
+        response = _http_request("GET", url, headers)
+        if response.status == 304 and cached:
+            cached["ts"] = time.time()
+            _save_cache(cache_path, cached)
+            return True, cached["json"]
+        elif response.status == 200:
+            data = _loads(response.data)
+            if cache_path:
+                _save_cache(cache_path, {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "json": data,
+                    "ts": time.time(),
+                })
+            return True, data
+        elif response.status == 404:
+            return False, None
+        else:
+            print(f"API错误 {label}: {response.status}", file=sys.stderr)
+            return False, None
+    except Exception as e:
+        print(f"API请求异常 {label}: {e}", file=sys.stderr)
+        return False, None
+
+
 def _get_github_api(
     endpoint: str, 
     headers: Dict[str, str], 
     owner: str, 
     repo: str = CONFIG["ENVIRONMENT"]["default_repo"]
 ) -> Tuple[bool, Optional[Dict]]:
-    """调用GitHub API获取数据"""
+    """调用GitHub API获取数据（带缓存）"""
+    cache_path = _cache_path(owner, repo, endpoint)
+    cached = _load_cache(cache_path)
+    # 提交内容不可变，缓存永不过期；其余接口（如文件内容）总是用ETag重新验证
+    if cached and endpoint.startswith("commits/"):
+        return True, cached["json"]
+
     url = f"https://api.github.com/repos/{owner}/{repo}/{endpoint}"
+    return _request_json(url, headers, endpoint, cache_path, cached)
+
+
+def _search_markdown_files(
+    text: str,
+    headers: Dict[str, str],
+    owner: str,
+    repo: str = CONFIG["ENVIRONMENT"]["default_repo"],
+    limit: int = 5
+) -> List[str]:
+    """通过代码搜索API查找包含指定文本的Markdown文件，最多返回limit个路径（仅索引默认分支）"""
+    query = quote(f'"{text}" in:file repo:{owner}/{repo} extension:md')
+    cache_path = _cache_path(owner, repo, f"search/code?q={query}")
+    cached = _load_cache(cache_path)
+    # 搜索结果在TTL内直接使用缓存，过期后用ETag重新验证
+    if cached and time.time() - cached.get("ts", 0) < CONFIG["CACHE"]["ttl_seconds"]:
+        success, result = True, cached["json"]
+    else:
+        success, result = _request_json(
+            f"https://api.github.com/search/code?q={query}", headers, "search/code",
+            cache_path, cached
+        )
+    if not success or not result:
+        return []
+
+    items = result.get("items") or []
+    return [item["path"] for item in items[:limit] if item.get("path")]
+
+
+def _get_commit(
+    sha: str,
+    headers: Dict[str, str],
+    owner: str,
+    repo: str = CONFIG["ENVIRONMENT"]["default_repo"]
+) -> Tuple[bool, Optional[Dict]]:
+    """通过GraphQL获取提交信息（提交不可变，结果永久缓存）"""
+    cache_path = _cache_path(owner, repo, f"graphql/commits/{sha}")
+    cached = _load_cache(cache_path)
+    if cached:
+        return True, cached["json"]
+
+    payload = {"query": _COMMIT_QUERY, "variables": {"o": owner, "r": repo, "s": sha}}
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        if response.status_code == 200:
-            return True, response.json()
-        elif response.status_code == 404:
-            return False, None
-        else:
-            print(f"API错误 {endpoint}: {response.status_code}", file=sys.stderr)
+        response = _http_request(
+            "POST",
+            "https://api.github.com/graphql",
+            {**headers, "Content-Type": "application/json"},
+            json.dumps(payload).encode("utf-8"),
+        )
+        if response.status != 200:
+            print(f"API错误 graphql/commits/{sha}: {response.status}", file=sys.stderr)
             return False, None
+        result = _loads(response.data)
     except Exception as e:
-        print(f"API请求异常 {endpoint}: {e}", file=sys.stderr)
+        print(f"API请求异常 graphql/commits/{sha}: {e}", file=sys.stderr)
         return False, None
 
+    # GraphQL的限流、权限不足等错误以HTTP 200加errors数组返回
+    errors = result.get("errors")
+    if errors:
+        messages = "; ".join(err.get("message", str(err)) for err in errors)
+        print(f"API错误 graphql/commits/{sha}: {messages}", file=sys.stderr)
+        return False, None
 
-def _get_file_content(
+    # 无错误但对象为空，说明提交不存在
+    commit = ((result.get("data") or {}).get("repository") or {}).get("object")
+    if not commit:
+        return False, None
+
+    # 转换为与REST提交接口一致的结构
+    data = {"sha": commit.get("oid"), "commit": {"message": commit.get("message", "")}}
+    _save_cache(cache_path, {"json": data, "ts": time.time()})
+    return True, data
+
+
+def _get_commit_files(
+    sha: str,
+    headers: Dict[str, str],
+    owner: str,
+    repo: str = CONFIG["ENVIRONMENT"]["default_repo"]
+) -> Optional[List[Dict]]:
+    """通过REST接口获取提交修改的文件列表（GraphQL不提供该信息）"""
+    success, result = _get_github_api(f"commits/{sha}", headers, owner, repo)
+    if not success or not result:
+        return None
+    return result.get("files", [])
+
+
+def _get_file_content_from_api(
     file_path: str,
     headers: Dict[str, str],
     owner: str,
     repo: str = CONFIG["ENVIRONMENT"]["default_repo"],
     ref: str = CONFIG["ENVIRONMENT"]["default_branch"],
 ) -> Optional[str]:
-    """获取指定文件内容"""
+    """通过contents API获取文件内容（每次都用ETag重新验证，结果不会过期）"""
     success, result = _get_github_api(
         f"contents/{file_path}?ref={ref}", headers, owner, repo
     )
@@ -93,6 +308,58 @@ def _get_file_content(
         return None
 
 
+def _get_file_content(
+    file_path: str,
+    headers: Dict[str, str],
+    owner: str,
+    repo: str = CONFIG["ENVIRONMENT"]["default_repo"],
+    ref: str = CONFIG["ENVIRONMENT"]["default_branch"],
+    max_bytes: Optional[int] = None,
+) -> Optional[str]:
+    """获取指定文件内容（优先使用raw端点，避免base64编码的额外开销）
+
+    raw端点位于CDN之后，内容可能滞后数分钟，只适合扫描类请求；
+    需要最新内容时使用_get_file_content_from_api。
+    指定max_bytes时通过Range请求只读取文件开头部分（仅raw端点支持，
+    回退到contents API时返回完整文件）。
+    """
+    if max_bytes is not None and max_bytes <= 0:
+        raise ValueError(f"max_bytes必须为正整数: {max_bytes}")
+
+    raw_url = f"https://raw.githubusercontent.com/{owner}/{repo}/{ref}/{file_path}"
+    raw_headers = headers
+    if max_bytes is not None:
+        raw_headers = {**headers, "Range": f"bytes=0-{max_bytes - 1}"}
+    try:
+        response = _http_request("GET", raw_url, raw_headers)
+    except Exception as e:
+        print(f"API请求异常 raw/{file_path}: {e}", file=sys.stderr)
+        return None
+
+    if response.status == 200:
+        try:
+            return response.data.decode("utf-8")
+        except UnicodeDecodeError as e:
+            print(f"文件解码错误 {file_path}: {e}", file=sys.stderr)
+            return None
+    elif response.status == 206:
+        # 部分内容可能在多字节字符中间截断，增量解码器会丢弃末尾不完整的字符
+        try:
+            return codecs.getincrementaldecoder("utf-8")().decode(response.data)
+        except UnicodeDecodeError as e:
+            print(f"文件解码错误 {file_path}: {e}", file=sys.stderr)
+            return None
+    elif response.status == 416:
+        # 空文件无法满足Range请求，按空内容处理
+        return ""
+    elif response.status not in (403, 404):
+        print(f"API错误 raw/{file_path}: {response.status}", file=sys.stderr)
+        return None
+
+    # raw端点返回403/404时（私有仓库的令牌不被raw端点接受时也返回404），回退到contents API
+    return _get_file_content_from_api(file_path, headers, owner, repo, ref)
+
+
 def _validate_required_env_vars(required_vars: list) -> bool:
     """验证必要的环境变量是否存在"""
     missing = [var for var in required_vars if not os.environ.get(var)]
@@ -103,8 +370,7 @@ def _validate_required_env_vars(required_vars: list) -> bool:
 
 
 def _verify_single_sha(content: str, expected_sha: str) -> bool:
-    """验证单个SHA是否匹配"""
-    content = content.strip()
+    """验证单个SHA是否匹配（content需已去除首尾空白）"""
     if content != expected_sha:
         print(f"错误: SHA不匹配。预期 {expected_sha}，实际: {content}", file=sys.stderr)
         return False
@@ -117,13 +383,13 @@ def _verify_commit_details(commit_data: Dict, target_entry: str, target_section:
     target_entry_lower = target_entry.lower() if target_entry else ""
     target_section_lower = target_section.lower() if target_section else ""
     
-    # 宽松验证：检查提交是否修改了任何Markdown文档
-    modified_files = [f.get('filename') for f in commit_data.get('files', [])]
-    md_files = [f for f in modified_files if f.endswith('.md')]
-    
-    if not md_files:
-        print(f"警告: 提交未修改任何Markdown文档", file=sys.stderr)
-        # 不强制要求，只是警告
+    # 宽松验证：检查提交是否修改了任何Markdown文档（仅在提供文件列表时）
+    if 'files' in commit_data:
+        has_md = any((f.get('filename') or '').endswith('.md') for f in commit_data['files'])
+
+        if not has_md:
+            print(f"警告: 提交未修改任何Markdown文档", file=sys.stderr)
+            # 不强制要求，只是警告
     
     # 宽松验证：检查提交信息是否包含关键词（部分匹配即可）
     if target_entry and target_entry_lower not in commit_message:
@@ -139,10 +405,22 @@ def _verify_commit_details(commit_data: Dict, target_entry: str, target_section:
 
 def _find_target_file(headers: Dict[str, str], owner: str, repo: str, branch: str) -> Optional[str]:
     """查找包含目标章节的Markdown文件"""
-    # 尝试搜索包含目标章节的文件
     target_section = os.environ.get(CONFIG["TASK"]["target"]["section_name_var"], "Deep Learning Fundamentals")
-    
-    # 常见的可能文件路径
+
+    # 预编译忽略大小写的匹配模式，避免为每个文件生成小写副本
+    section_re = re.compile(re.escape(target_section), re.IGNORECASE)
+    # 章节标题通常位于文件开头，每个文件只读取前64 KiB
+    max_bytes = 64 * 1024
+
+    # 代码搜索只索引默认分支，且为分词匹配，命中结果需在目标分支上确认
+    if branch == CONFIG["ENVIRONMENT"]["default_branch"]:
+        for file_path in _search_markdown_files(target_section, headers, owner, repo):
+            content = _get_file_content(file_path, headers, owner, repo, branch, max_bytes)
+            if content and section_re.search(content):
+                print(f"找到目标文件: {file_path}")
+                return file_path
+
+    # 搜索无结果或未通过确认时，回退到常见的可能文件路径
     possible_paths = [
         "docs/deep_learning.md",
         "articles/ai_basics.md",
@@ -150,100 +428,111 @@ def _find_target_file(headers: Dict[str, str], owner: str, repo: str, branch: st
         "tutorials/deep_learning_fundamentals.md",
         "docs/ai_fundamentals.md"
     ]
-    
-    for file_path in possible_paths:
-        content = _get_file_content(file_path, headers, owner, repo, branch)
-        if content and target_section.lower() in content.lower():
-            print(f"找到目标文件: {file_path}")
-            return file_path
-    
+
+    # 并发探测所有候选路径（共享连接池），按列表顺序检查结果以保持优先级，
+    # 命中后直接返回，不等待其余探测完成
+    ex = ThreadPoolExecutor(max_workers=len(possible_paths))
+    try:
+        futures = [
+            ex.submit(_get_file_content, p, headers, owner, repo, branch, max_bytes)
+            for p in possible_paths
+        ]
+        for file_path, future in zip(possible_paths, futures):
+            content = future.result()
+            if content and section_re.search(content):
+                print(f"找到目标文件: {file_path}")
+                return file_path
+    finally:
+        ex.shutdown(wait=False)
+
     print(f"警告: 未找到明确包含'{target_section}'章节的文件")
     return None
 
 # -----------------------------
-# 3) 主验证流程
+# 4) 主验证流程
 # -----------------------------
 def verify_task() -> bool:
     """主验证流程"""
-    # 加载环境变量
-    env_file = CONFIG["ENVIRONMENT"]["env_file_path"]
-    load_dotenv(env_file)
+    # 常用配置项绑定到局部变量
+    env = CONFIG["ENVIRONMENT"]
+    task = CONFIG["TASK"]
+    answer_cfg = task["answer_file"]
+    target_cfg = task["target"]
+    validation = task["validation_strategy"]
+    environ = os.environ
+
+    # 加载环境变量（文件不存在时跳过，CI中通常已直接注入环境变量）
+    env_file = env["env_file_path"]
+    if os.path.exists(env_file):
+        from dotenv import load_dotenv
+        load_dotenv(env_file)
 
     # 获取配置信息
-    github_token = os.environ.get(CONFIG["ENVIRONMENT"]["github_token_var"])
-    github_owner = os.environ.get(CONFIG["ENVIRONMENT"]["github_owner_var"])
-    target_repo = os.environ.get(
-        CONFIG["ENVIRONMENT"]["target_repo_var"], 
-        CONFIG["ENVIRONMENT"]["default_repo"]
-    )
-    target_branch = os.environ.get(
-        CONFIG["ENVIRONMENT"]["target_branch_var"], 
-        CONFIG["ENVIRONMENT"]["default_branch"]
-    )
+    github_token = environ.get(env["github_token_var"])
+    github_owner = environ.get(env["github_owner_var"])
+    target_repo = environ.get(env["target_repo_var"], env["default_repo"])
+    target_branch = environ.get(env["target_branch_var"], env["default_branch"])
     
     # 任务特定配置
-    expected_sha = os.environ.get(CONFIG["TASK"]["expected_sha_var"])
-    answer_file = os.environ.get(
-        CONFIG["TASK"]["answer_file"]["name_var"],
-        CONFIG["TASK"]["answer_file"]["default_name"]
-    )
-    target_entry = os.environ.get(CONFIG["TASK"]["target"]["entry_name_var"], "Neural Network Architectures")
-    target_section = os.environ.get(CONFIG["TASK"]["target"]["section_name_var"], "Deep Learning Fundamentals")
+    expected_sha = environ.get(task["expected_sha_var"])
+    answer_file = environ.get(answer_cfg["name_var"], answer_cfg["default_name"])
+    target_entry = environ.get(target_cfg["entry_name_var"], "Neural Network Architectures")
+    target_section = environ.get(target_cfg["section_name_var"], "Deep Learning Fundamentals")
     
     # 验证策略
-    verify_details = os.environ.get(
-        CONFIG["TASK"]["validation_strategy"]["verify_commit_details"], 
-        "true"
-    ).lower() == "true"
+    verify_details = environ.get(validation["verify_commit_details"], "true").lower() == "true"
 
     # 验证必要的环境变量
     required_vars = [
-        CONFIG["ENVIRONMENT"]["github_token_var"],
-        CONFIG["ENVIRONMENT"]["github_owner_var"],
-        CONFIG["TASK"]["expected_sha_var"]
+        env["github_token_var"],
+        env["github_owner_var"],
+        task["expected_sha_var"]
     ]
     if not _validate_required_env_vars(required_vars):
         return False
 
-    # 准备GitHub API请求头
-    headers = {
-        "Authorization": f"Bearer {github_token}",
-        "Accept": "application/vnd.github.v3+json",
-    }
+    # 预期SHA格式错误时无需访问API，直接失败
+    if not _SHA_RE.fullmatch(expected_sha):
+        print(f"错误: 预期SHA格式无效 {expected_sha}，必须是40位十六进制字符", file=sys.stderr)
+        return False
+
+    # 准备GitHub API请求头（认证信息只在默认请求头上设置一次）
+    _DEFAULT_HEADERS["Authorization"] = f"Bearer {github_token}"
+    headers = {}
 
-    print(f"正在验证 {CONFIG['TASK']['name']} 任务...")
+    print(f"正在验证 {task['name']} 任务...")
 
     # 1. 检查答案文件是否存在
     print(f"1. 检查 {answer_file} 是否存在...")
-    content = _get_file_content(answer_file, headers, github_owner, target_repo, target_branch)
+    # 答案文件可能刚被修正，不能使用有CDN缓存的raw端点
+    content = _get_file_content_from_api(answer_file, headers, github_owner, target_repo, target_branch)
     if not content:
         print(f"错误: 仓库中未找到 {answer_file}", file=sys.stderr)
         return False
+    content = content.strip()
     print(f"✓ 找到 {answer_file}")
 
     # 2. 检查文件内容是否匹配预期SHA
     print(f"2. 检查 {answer_file} 内容...")
-    content = content.strip()
-    
     if not _verify_single_sha(content, expected_sha):
         return False
     print(f"✓ {answer_file} 内容正确")
 
     # 3. 验证提交是否存在且有效
     print(f"3. 验证提交是否存在...")
-    
-    # 验证SHA格式是否正确（40位十六进制）
-    if not (len(content) == 40 and all(c in '0123456789abcdefABCDEF' for c in content)):
-        print(f"错误: 无效的SHA格式 {content}，必须是40位十六进制字符", file=sys.stderr)
-        return False
-        
-    success, commit_data = _get_github_api(f"commits/{content}", headers, github_owner, target_repo)
+
+    # 内容与预期SHA一致，而预期SHA的格式已在开头校验，无需重复检查
+    success, commit_data = _get_commit(content, headers, github_owner, target_repo)
     if not success or not commit_data:
         print(f"错误: 仓库中未找到提交 {content}", file=sys.stderr)
         return False
         
     # 验证提交详情（宽松验证）
     if verify_details:
+        # GraphQL查询不含修改文件列表，仅在验证详情时通过REST接口补充
+        files = _get_commit_files(content, headers, github_owner, target_repo)
+        if files is not None:
+            commit_data = {**commit_data, "files": files}
         if not _verify_commit_details(commit_data, target_entry, target_section):
             # 宽松模式下，验证失败只输出警告，不终止流程
             print("⚠ 提交详情验证有警告，但继续执行...")
@@ -252,7 +541,7 @@ def verify_task() -> bool:
 
     # 所有检查通过
     print("\n✅ 所有验证检查通过!")
-    print(f"任务 {CONFIG['TASK']['name']} 成功完成:")
+    print(f"任务 {task['name']} 成功完成:")
     print(f"  - 已创建 {answer_file}，内容正确: {content}")
     print(f"  - 提交在仓库中存在且有效")
 